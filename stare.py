@@ -1,19 +1,50 @@
 import requests
+from requests.adapters import HTTPAdapter, Retry
 import websockets
 import asyncio
 import json
+from operator import itemgetter
 from urllib.parse import urljoin
 import tkinter as tk
 from tkinter import ttk, messagebox
 import time
-import threading
 import logging
+import math
+import random
+import socket
+import threading
+import os
+import tempfile
 import aiohttp
 import sys
 
+# 可选依赖：uvloop（libuv 实现的事件循环）在 Linux/macOS 上能显著降低
+# 每条 WebSocket 消息的调度开销，Windows 上不可用时自动回退到标准 asyncio
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# 可选依赖：orjson（C 实现的 JSON 解析器）比标准库快数倍，
+# ticker 消息每帧都要解析一次，这里是接收路径的主要 CPU 开销
+try:
+    import orjson
+    _loads = orjson.loads
+
+    def _dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj).encode()
+
 # API 配置
 OKX_BASE_URL = "https://www.okx.com"
 OKX_WS_URL = "wss://ws.okx.com:8443/ws/v5/public"
+# 单条WS连接最多订阅的交易对数，超出时分片到多条连接
+OKX_MAX_SYMBOLS_PER_WS = 50
 BINANCE_BASE_URL = "https://fapi.binance.com"
 BINANCE_WS_URL = "wss://fstream.binance.com/stream"
 
@@ -23,23 +54,108 @@ DEFAULT_PROXY = {
     'https': 'http://127.0.0.1:7897'
 }
 
+# OKX ticker里要读的五个字段一次取出：itemgetter是C实现，
+# 省掉热路径上五次Python层的字典下标分派
+_OKX_TICKER_FIELDS = itemgetter('instId', 'last', 'open24h', 'high24h', 'low24h')
+
+# 价格格式按数量级(log10)查表，热路径上一次查找代替四级if/elif：
+# >=1000 千分位两位小数；>=1 四位；>=0.0001 六位；更小的八位
+_PRICE_FMT = {3: '{:,.2f}',
+              2: '{:.4f}', 1: '{:.4f}', 0: '{:.4f}',
+              -1: '{:.6f}', -2: '{:.6f}', -3: '{:.6f}', -4: '{:.6f}'}
+_PRICE_FMT_DEFAULT = '{:.8f}'
+
+# 合约列表本地缓存：SWAP合约列表以天为单位变化，
+# 短TTL内重启/刷新直接读本地文件，省一次HTTPS往返
+INSTRUMENTS_CACHE = os.path.join(tempfile.gettempdir(), 'stare_okx_instruments.json')
+INSTRUMENTS_CACHE_TTL = 3600  # 秒
+
+
+class _TickerState:
+    """单个交易对待刷新的标签状态，__slots__省掉每实例的__dict__"""
+    __slots__ = ('text', 'color', 'dirty')
+
+    def __init__(self):
+        self.text = ''
+        self.color = 'black'
+        self.dirty = False
+
+
 class PriceMonitor(tk.Toplevel):
-    def __init__(self, selected_pairs, exchange="okx", use_proxy=False, proxy_settings=None):
+    def __init__(self, selected_pairs, exchange="okx", use_proxy=False, proxy_settings=None,
+                 update_freq=0.1):
         super().__init__()
         self.selected_pairs = selected_pairs
         self.exchange = exchange.lower()
+        # 标签刷新的最小间隔（秒）：行情帧率再高，界面也只按这个节奏重绘
+        self.update_freq = update_freq
+        self._flush_ms = max(1, int(update_freq * 1000))
         self.ws = None
         self.loop = None
         self.running = True
         self.use_proxy = use_proxy
         self.proxy_settings = proxy_settings
-        
+
+        # 交易对按单连接订阅上限分片，每个分片一条WS连接；
+        # 各分片的订阅消息只序列化一次，重连时直接复用
+        self._okx_shards = [
+            selected_pairs[i:i + OKX_MAX_SYMBOLS_PER_WS]
+            for i in range(0, len(selected_pairs), OKX_MAX_SYMBOLS_PER_WS)
+        ]
+        self._okx_subscribe = [
+            _dumps({
+                "op": "subscribe",
+                "args": [
+                    {"channel": "tickers", "instId": pair}
+                    for pair in shard
+                ]
+            }).decode()
+            for shard in self._okx_shards
+        ]
+
+        # Binance符号 -> 原始交易对 的映射只构建一次，
+        # 处理消息时O(1)查表，替代每帧对所有交易对做replace/upper的线性扫描
+        self._bn_sym_map = {
+            pair.replace('-', '').replace('SWAP', '').upper(): pair
+            for pair in selected_pairs
+        }
+
+        # 每个交易对的显示模板只拼一次，热路径上只做.format填充，
+        # 交易对名称、"24h高/低"等固定文本不再逐帧重新构造
+        self._tmpl = {
+            pair: pair + ": {price} ({change})\n24h高: {h:.4f} 低: {l:.4f}"
+            for pair in selected_pairs
+        }
+        self._tmpl_flat = {pair: pair + ": {price}" for pair in selected_pairs}
+
+        # 待刷新的标签更新：按交易对合并，一次Tk回调批量写入
+        # （事件循环跑在Tk主线程上，无需加锁）；
+        # 状态对象在此一次性预分配，热路径上只改字段，不再逐帧建元组
+        self._pending = {pair: _TickerState() for pair in selected_pairs}
+        self._flush_scheduled = False
+
+        # 每个交易对上一帧的行情，用于跳过内容未变的重复帧
+        self._last_tick = {}
+
+        # 热路径上的错误日志限速，防止网络抖动时刷屏拖垮接收循环
+        self._last_log_t = 0.0
+
         # 设置窗口属性
         self.setup_window()
         # 创建UI组件
         self.create_ui()
-        # 启动WebSocket连接
-        threading.Thread(target=self.run_async_loop, daemon=True).start()
+        # 在Tk主线程上驱动asyncio事件循环，不再为WebSocket另起线程：
+        # 省掉跨线程的GIL唤醒和after(0)回调跳转
+        if sys.platform.startswith('win'):
+            self.loop = asyncio.SelectorEventLoop()
+        elif uvloop is not None:
+            # 非Windows平台优先使用uvloop，减少每条消息的事件循环开销
+            self.loop = uvloop.new_event_loop()
+        else:
+            self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._run_streams())
+        self.after(1, self._pump)
         
         # 绑定鼠标事件
         self.bind('<Enter>', self.on_enter)
@@ -47,7 +163,9 @@ class PriceMonitor(tk.Toplevel):
         self.title_frame.bind('<Button-1>', self.start_move)
         self.title_frame.bind('<B1-Motion>', self.on_move)
         
-        # 初始状态设置为半透明
+        # 初始状态设置为半透明（_hover先置True让首次on_leave走完整流程）
+        self._hover = True
+        self._leave_check = None
         self.on_leave(None)
     
     def setup_window(self):
@@ -102,13 +220,17 @@ class PriceMonitor(tk.Toplevel):
             style="Transparent.TLabel"
         )
         self.traffic_label.pack(pady=2)
-        
-        # 为每个选中的交易对创建标签
+        # 流量标签按1Hz刷新，接收路径上只累加计数器
+        self.after(1000, self._tick_traffic)
+
+
+        # 为每个选中的交易对创建标签；初始只显示交易对名称，
+        # 完整行情文本等首帧到达后由模板填充
         for pair in self.selected_pairs:
             label = ttk.Label(
-                self.price_frame, 
-                text=f"{pair}: 加载中...",
-                style="Transparent.TLabel"
+                self.price_frame,
+                text=pair,
+                style="Price.TLabel"
             )
             label.pack(pady=2)
             self.price_labels[pair] = label
@@ -117,135 +239,177 @@ class PriceMonitor(tk.Toplevel):
         """设置UI样式"""
         self.style = ttk.Style()
         self.style.configure("Transparent.TFrame", background='white')
-        self.style.configure("Transparent.TLabel", 
+        self.style.configure("Transparent.TLabel",
                            background='white',
                            font=('Arial', 10),
                            foreground='#333333')
+        # 价格标签的粗体样式只在这里配置一次，
+        # 避免每次行情更新都让Tk重新解析字体
+        self.style.configure("Price.TLabel",
+                           background='white',
+                           font=('Arial', 10, 'bold'),
+                           foreground='#333333')
         
         self.main_frame.configure(style="Transparent.TFrame")
         self.price_frame.configure(style="Transparent.TFrame")
         self.title_frame.configure(style="Transparent.TFrame")
 
-    def run_async_loop(self):
-        """在新线程中运行事件循环"""
+    def _pump(self):
+        """在Tk主线程上推进asyncio事件循环一步，然后重新调度自己
+
+        轮询间隔自适应：有定时任务更早到期时提前唤醒，避免白等。
+        """
+        if not self.running:
+            return
         try:
-            # 在Windows上使用SelectorEventLoop
-            if sys.platform.startswith('win'):
-                loop = asyncio.SelectorEventLoop()
-                asyncio.set_event_loop(loop)
-            else:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            self.loop = loop
-            
-            if self.exchange == "okx":
-                self.loop.run_until_complete(self.okx_websocket_connect())
-            elif self.exchange == "binance":
-                self.loop.run_until_complete(self.binance_websocket_connect())
+            self.loop.call_soon(self.loop.stop)
+            self.loop.run_forever()
         except Exception as e:
             logging.error(f"WebSocket事件循环错误: {e}")
-        finally:
-            # 确保循环正确关闭
-            if self.loop and self.loop.is_running():
-                self.loop.stop()
-            if self.loop and not self.loop.is_closed():
-                self.loop.close()
+        delay = 10
+        scheduled = getattr(self.loop, '_scheduled', None)
+        if scheduled:
+            # _scheduled是按到期时间排序的堆，堆顶即最近的定时任务
+            delta_ms = int((scheduled[0]._when - self.loop.time()) * 1000)
+            delay = min(delay, max(1, delta_ms))
+        self.after(delay, self._pump)
+
+    async def _run_streams(self):
+        """并发运行所选交易所的行情流
+
+        用gather聚合成单一入口任务：之后要同时盯多个交易所，
+        只需往streams里多放一个协程，不必再动线程或循环结构。
+        """
+        streams = []
+        if self.exchange == "okx":
+            streams.append(self.okx_websocket_connect())
+        elif self.exchange == "binance":
+            streams.append(self.binance_websocket_connect())
+        if streams:
+            await asyncio.gather(*streams)
 
     async def okx_websocket_connect(self):
-        """建立并维护OKX WebSocket连接"""
+        """并发维护所有分片的OKX WebSocket连接和一个集中的解析任务"""
+        # 接收和解析解耦：各分片只管尽快把原始帧塞进队列腾空socket缓冲区，
+        # 解析/分发由单个消费者串行完成。队列有界，积压时丢最旧的帧——
+        # ticker是全量快照，丢旧帧只是晚看到一拍，不会错账
+        self._rx_queue = asyncio.Queue(maxsize=256)
+        await asyncio.gather(
+            self._okx_dispatch(),
+            *(self._okx_ws_shard(subscribe)
+              for subscribe in self._okx_subscribe)
+        )
+
+    async def _okx_dispatch(self):
+        """消费者：从队列取原始帧，解析JSON并逐条分发ticker"""
+        while self.running:
+            message = await self._rx_queue.get()
+            try:
+                data = _loads(message)
+                if 'data' in data:
+                    # OKX一帧可能携带多条ticker，逐条处理而不是只取第一条
+                    for ticker in data['data']:
+                        self.handle_okx_ticker_update(ticker)
+            except Exception as e:
+                self._log_error(f"处理 WebSocket 消息时出错: {e}")
+
+    async def _okx_ws_shard(self, subscribe):
+        """建立并维护一条OKX WebSocket连接（对应一个交易对分片）"""
+        backoff = 1.0
+        connected_at = None
         while self.running:  # 添加外层循环以支持重连
             try:
-                async with websockets.connect(OKX_WS_URL) as ws:
+                # 关闭permessage-deflate压缩协商：ticker帧很小，压缩/解压的CPU开销
+                # 远大于节省的带宽；同时限制单帧大小防止异常大帧
+                # 心跳交给库的ping_interval/ping_timeout后台任务处理
+                async with websockets.connect(OKX_WS_URL,
+                                              compression=None,
+                                              max_size=2**20,
+                                              ping_interval=15,
+                                              ping_timeout=10) as ws:
                     self.ws = ws
-                    # 订阅所有选中交易对的 tickers
-                    subscribe_msg = {
-                        "op": "subscribe",
-                        "args": [
-                            {
-                                "channel": "tickers",
-                                "instId": pair
-                            } for pair in self.selected_pairs
-                        ]
-                    }
-                    await ws.send(json.dumps(subscribe_msg))
-                    
-                    # 添加心跳检测
-                    last_msg_time = time.time()
-                    
-                    # 持续接收消息
+                    # 关闭Nagle算法并开启TCP保活：ticker是小帧协议，
+                    # Nagle的合并延迟会叠加在行情延迟上
+                    try:
+                        sock = ws.transport.get_extra_info('socket')
+                        if sock is not None:
+                            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                    except Exception:
+                        pass  # transport接口因平台/库版本而异，拿不到socket就算了
+                    # 订阅本分片的所有 tickers（载荷在__init__中已序列化好）
+                    await ws.send(subscribe)
+                    connected_at = time.monotonic()
+
+                    # 持续接收消息：decode=False让库直接交出原始bytes，
+                    # 省掉每帧的UTF-8解码拷贝（orjson和stdlib json都接受bytes）；
+                    # 连接失活由库的心跳超时触发 ConnectionClosed 后走外层重连
                     while self.running:
-                        try:
-                            # 设置接收超时
-                            message = await asyncio.wait_for(ws.recv(), timeout=5)
-                            last_msg_time = time.time()
-                            
-                            # 更新流量统计（添加接收到的消息大小）
-                            self.update_traffic_stats(len(message))
-                            data = json.loads(message)
-                            if 'data' in data:
-                                self.handle_okx_ticker_update(data['data'][0])
-                            
-                            # 检查是否需要发送心跳
-                            if time.time() - last_msg_time > 20:
-                                await ws.send(json.dumps({"op": "ping"}))
-                                
-                        except asyncio.TimeoutError:
-                            # 超时后尝试发送心跳
+                        message = await ws.recv(decode=False)
+                        # 更新流量统计（添加接收到的消息大小）
+                        self.update_traffic_stats(len(message))
+                        # 订阅确认/pong等控制帧没有"data"键，
+                        # 便宜的子串检查先把它们筛掉，不必完整解析JSON
+                        if b'"data"' not in message:
+                            continue
+                        # 入队交给_okx_dispatch解析；队列满了丢最旧的帧
+                        if self._rx_queue.full():
                             try:
-                                await ws.send(json.dumps({"op": "ping"}))
-                            except:
-                                # 如果发送心跳失败，跳出内层循环进行重连
-                                break
-                        except Exception as e:
-                            logging.error(f"处理 WebSocket 消息时出错: {e}")
-                            await asyncio.sleep(1)
-                            
-                            # 如果太长时间没有收到消息，跳出内层循环进行重连
-                            if time.time() - last_msg_time > 30:
-                                break
+                                self._rx_queue.get_nowait()
+                            except asyncio.QueueEmpty:
+                                pass
+                        self._rx_queue.put_nowait(message)
                             
             except Exception as e:
                 logging.error(f"WebSocket 连接错误: {e}")
                 if self.running:
-                    # 连接失败后等待一段时间再重试
-                    await asyncio.sleep(5)
+                    # 只有连接稳定存活超过30秒才重置退避，
+                    # 避免“连上就被踢”的循环以1秒间隔反复打端点
+                    if connected_at is not None and time.monotonic() - connected_at > 30.0:
+                        backoff = 1.0
+                    connected_at = None
+                    # 指数退避加随机抖动：避免长时间断网时高频空转重连
+                    await asyncio.sleep(backoff + random.random())
+                    backoff = min(60.0, backoff * 2)
 
     async def binance_websocket_connect(self):
-        """建立并维护Binance WebSocket连接"""
-        while self.running:
-            try:
-                # 构建订阅数据
-                subscribe_message = {
-                    "method": "SUBSCRIBE",
-                    "params": [
-                        f"{pair.lower()}@ticker" for pair in self.selected_pairs
-                    ],
-                    "id": 1
-                }
-                
-                # 修改连接器配置，禁用DNS缓存
-                connector = aiohttp.TCPConnector(ssl=False, use_dns_cache=False)
-                
-                # 根据代理设置决定是否使用代理
-                proxy = self.proxy_settings.get('http', None) if self.use_proxy else None
-                
-                async with aiohttp.ClientSession(connector=connector) as session:
+        """建立并维护Binance WebSocket连接
+
+        ClientSession在整个监控期间只创建一次，重连时复用它的连接池，
+        不再每次重建connector、重做DNS解析和TLS准备。
+        """
+        # 组合流URL直接在连接时带上所有订阅：
+        # 省去SUBSCRIBE消息往返，推送的帧由服务端按stream路由好
+        stream_url = BINANCE_WS_URL + '?streams=' + '/'.join(
+            f"{symbol.lower()}@ticker" for symbol in self._bn_sym_map
+        )
+
+        # 根据代理设置决定是否使用代理；设置不完整时get_proxy_settings
+        # 会传来None，这里在try之外，不能让它炸掉整个流任务
+        proxy = (self.proxy_settings or {}).get('http') if self.use_proxy else None
+
+        # 缓存DNS解析结果、保持底层连接复用，重连时省掉解析和握手开销
+        connector = aiohttp.TCPConnector(ssl=False, ttl_dns_cache=300,
+                                         keepalive_timeout=60, limit=4)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            backoff = 1.0
+            connected_at = None
+            while self.running:
+                try:
                     async with session.ws_connect(
-                        BINANCE_WS_URL,
+                        stream_url,
                         proxy=proxy,
                         timeout=aiohttp.ClientTimeout(total=30),
                         heartbeat=20
                     ) as ws:
                         self.ws = ws
-                        # 发送订阅消息
-                        await ws.send_json(subscribe_message)
-                        
+                        connected_at = time.monotonic()  # 订阅包含在URL中
+
                         async for msg in ws:
                             if msg.type == aiohttp.WSMsgType.TEXT:
                                 # 添加流量统计
                                 self.update_traffic_stats(len(msg.data))
-                                data = json.loads(msg.data)
+                                data = _loads(msg.data)
                                 # 修正数据处理逻辑
                                 if 'e' in data and data['e'] == '24hrTicker':
                                     self.handle_binance_ticker_update(data)
@@ -254,65 +418,86 @@ class PriceMonitor(tk.Toplevel):
                             elif msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
                                 break
 
-            except Exception as e:
-                logging.error(f"Binance WebSocket 连接错误: {e}")
+                except Exception as e:
+                    logging.error(f"Binance WebSocket 连接错误: {e}")
+                # 服务端正常关闭时async for直接结束、不抛异常，
+                # 所以退避统一放在这里：任何断开方式都要经过它
                 if self.running:
-                    await asyncio.sleep(5)
+                    # 只有连接稳定存活超过30秒才重置退避，
+                    # 避免“连上就被踢”的循环以1秒间隔反复打端点
+                    if connected_at is not None and time.monotonic() - connected_at > 30.0:
+                        backoff = 1.0
+                    connected_at = None
+                    # 指数退避加随机抖动：避免长时间断网时高频空转重连
+                    await asyncio.sleep(backoff + random.random())
+                    backoff = min(60.0, backoff * 2)
+
+    def _log_error(self, msg):
+        """限速的错误日志：每秒最多记一条，避免异常风暴时日志I/O阻塞接收循环"""
+        now = time.monotonic()
+        if now - self._last_log_t > 1.0:
+            logging.error(msg)
+            self._last_log_t = now
 
     def handle_okx_ticker_update(self, ticker_data):
         """处理OKX WebSocket ticker更新"""
         try:
-            pair = ticker_data['instId']
-            last_price = float(ticker_data['last'])
-            open_price = float(ticker_data['open24h'])
-            high_24h = float(ticker_data['high24h'])
-            low_24h = float(ticker_data['low24h'])
-            
+            pair, last_s, open_s, high_s, low_s = _OKX_TICKER_FIELDS(ticker_data)
+
+            # 直接用原始字符串判重：重复帧（冷门合约很常见）连float解析都省掉
+            tick = (last_s, open_s, high_s, low_s)
+            if self._last_tick.get(pair) == tick:
+                return
+            self._last_tick[pair] = tick
+
+            last_price = float(last_s)
+            open_price = float(open_s)
+            high_24h = float(high_s)
+            low_24h = float(low_s)
+
             # 格式化价格和计算涨跌幅
             formatted_price = self.format_price(last_price)
             display_text, color = self.calculate_change(pair, last_price, open_price, high_24h, low_24h, formatted_price)
-            
-            self.after(0, self.update_label_safe, pair, display_text, color)
-            
+
+            self._stage_update(pair, display_text, color)
+
         except Exception as e:
-            logging.error(f"处理OKX ticker更新时出错: {e}")
+            self._log_error(f"处理OKX ticker更新时出错: {e}")
 
     def handle_binance_ticker_update(self, ticker_data):
         """处理 Binance WebSocket ticker 更新"""
         try:
-            # 获取原始交易对名称
-            symbol = ticker_data.get('s', '')
-            
-            # 在选中的交易对中查找匹配项
-            for original_pair in self.selected_pairs:
-                # 将原始交易对转换为 Binance 格式进行比较
-                cleaned_pair = original_pair.replace('-', '').replace('SWAP', '').upper()
-                if cleaned_pair == symbol:
-                    last_price = float(ticker_data.get('c', ticker_data.get('lastPrice', 0)))  # 最新价格
-                    open_price = float(ticker_data.get('o', ticker_data.get('openPrice', 0)))  # 24小时开盘价
-                    high_24h = float(ticker_data.get('h', ticker_data.get('highPrice', 0)))    # 24小时最高价
-                    low_24h = float(ticker_data.get('l', ticker_data.get('lowPrice', 0)))     # 24小时最低价
-                    
-                    # 格式化价格和计算涨跌幅
-                    formatted_price = self.format_price(last_price)
-                    display_text, color = self.calculate_change(original_pair, last_price, open_price, high_24h, low_24h, formatted_price)
-                    
-                    self.after(0, self.update_label_safe, original_pair, display_text, color)
-                    break
-                
+            # 用预构建的映射O(1)定位原始交易对，不在选中列表里的符号直接忽略
+            original_pair = self._bn_sym_map.get(ticker_data.get('s', ''))
+            if original_pair is None:
+                return
+
+            last_price = float(ticker_data.get('c', ticker_data.get('lastPrice', 0)))  # 最新价格
+            open_price = float(ticker_data.get('o', ticker_data.get('openPrice', 0)))  # 24小时开盘价
+            high_24h = float(ticker_data.get('h', ticker_data.get('highPrice', 0)))    # 24小时最高价
+            low_24h = float(ticker_data.get('l', ticker_data.get('lowPrice', 0)))     # 24小时最低价
+
+            # 行情没变就直接返回，跳过格式化和标签更新
+            tick = (last_price, open_price, high_24h, low_24h)
+            if self._last_tick.get(original_pair) == tick:
+                return
+            self._last_tick[original_pair] = tick
+
+            # 格式化价格和计算涨跌幅
+            formatted_price = self.format_price(last_price)
+            display_text, color = self.calculate_change(original_pair, last_price, open_price, high_24h, low_24h, formatted_price)
+
+            self._stage_update(original_pair, display_text, color)
+
         except Exception as e:
-            logging.error(f"处理 Binance ticker 更新时出错: {e}")
+            self._log_error(f"处理 Binance ticker 更新时出错: {e}")
     
     def format_price(self, price):
-        """格式化价格显示"""
-        if price >= 1000:
-            return f"{price:,.2f}"
-        elif price >= 1:
-            return f"{price:.4f}"
-        elif price >= 0.0001:
-            return f"{price:.6f}"
-        else:
-            return f"{price:.8f}"
+        """格式化价格显示（按数量级查表选择格式）"""
+        if price <= 0:
+            return _PRICE_FMT_DEFAULT.format(price)
+        bucket = min(3, math.floor(math.log10(price)))
+        return _PRICE_FMT.get(bucket, _PRICE_FMT_DEFAULT).format(price)
     
     def calculate_change(self, pair, last_price, open_price, high_24h, low_24h, formatted_price):
         """计算价格变化并返回显示文本和颜色"""
@@ -325,12 +510,12 @@ class PriceMonitor(tk.Toplevel):
                 color = 'red'
                 change_text = f"{change_pct:.2f}%"
             
-            display_text = (
-                f"{pair}: {formatted_price} ({change_text})\n"
-                f"24h高: {high_24h:.4f} 低: {low_24h:.4f}"
+            display_text = self._tmpl[pair].format(
+                price=formatted_price, change=change_text,
+                h=high_24h, l=low_24h
             )
         else:
-            display_text = f"{pair}: {formatted_price}"
+            display_text = self._tmpl_flat[pair].format(price=formatted_price)
             color = 'black'
         
         return display_text, color
@@ -338,37 +523,59 @@ class PriceMonitor(tk.Toplevel):
     def quit_app(self):
         """完全退出应用"""
         self.running = False
-        if self.ws and self.loop and self.loop.is_running():
-            self.loop.create_task(self.ws.close())
         if self.loop:
-            self.loop.stop()
+            # 取消所有任务，并把取消流程真正跑到底再关闭：
+            # 这样async with的连接/会话清理才会执行，socket不会泄漏
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.loop.run_until_complete(
+                    asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
         self.destroy()  # 只关闭监控窗口
         self.master.deiconify()  # 显示主窗口
 
     def on_enter(self, event):
-        """鼠标进入窗口"""
-        # 检查鼠标是否在窗口范围内
-        x, y = self.winfo_pointerxy()
-        widget = self.winfo_containing(x, y)
-        if widget is not None and widget.winfo_toplevel() == self:
-            self.configure(bg='#f0f0f0')
-            self.attributes('-transparentcolor', '')
-            self.attributes('-alpha', 0.9)
-            # 显示关闭按钮
-            if not self.close_button.winfo_ismapped():
-                self.close_button.pack(side='right')
-    
+        """鼠标进入窗口
+
+        子控件的Enter事件也会冒泡到Toplevel的绑定上，所以能触发这里
+        就说明指针确实在窗口内，无需再做winfo指针查询。
+        """
+        if self._hover:
+            return
+        self._hover = True
+        self.configure(bg='#f0f0f0')
+        self.attributes('-transparentcolor', '')
+        self.attributes('-alpha', 0.9)
+        # 显示关闭按钮
+        if not self.close_button.winfo_ismapped():
+            self.close_button.pack(side='right')
+
     def on_leave(self, event):
-        """鼠标离开窗口"""
+        """鼠标离开窗口（延迟50ms确认，过滤移入子控件产生的假Leave）"""
+        if not self._hover or self._leave_check is not None:
+            return
+        self._leave_check = self.after(50, self._confirm_leave)
+
+    def _confirm_leave(self):
+        """确认指针真的离开窗口矩形后才切回半透明"""
+        self._leave_check = None
+        if not self._hover:
+            return
+        # 只做矩形包含判断，不再用winfo_containing遍历控件树
         x, y = self.winfo_pointerxy()
-        widget = self.winfo_containing(x, y)
-        if widget is None or widget.winfo_toplevel() != self:
-            self.configure(bg='white')
-            self.attributes('-transparentcolor', 'white')
-            self.attributes('-alpha', 0.7)
-            # 隐藏关闭按钮
-            if self.close_button.winfo_ismapped():
-                self.close_button.pack_forget()
+        wx, wy = self.winfo_rootx(), self.winfo_rooty()
+        if (wx <= x < wx + self.winfo_width() and
+                wy <= y < wy + self.winfo_height()):
+            return  # 还在窗口内，是移入子控件触发的Leave
+        self._hover = False
+        self.configure(bg='white')
+        self.attributes('-transparentcolor', 'white')
+        self.attributes('-alpha', 0.7)
+        # 隐藏关闭按钮
+        if self.close_button.winfo_ismapped():
+            self.close_button.pack_forget()
     
     def start_move(self, event):
         """开始移动窗口"""
@@ -384,26 +591,53 @@ class PriceMonitor(tk.Toplevel):
         self.geometry(f"+{x}+{y}")
     
     def update_traffic_stats(self, bytes_count):
-        """更新流量统计"""
+        """累加流量计数；标签刷新在_tick_traffic的1Hz定时器里做"""
         self.traffic_bytes += bytes_count
+
+    def _tick_traffic(self):
+        """每秒刷新一次流量统计标签"""
+        if not self.running:
+            return
         kb_traffic = self.traffic_bytes / 1024
         if kb_traffic > 1024:
             mb_traffic = kb_traffic / 1024
             self.traffic_label.config(text=f"流量统计: {mb_traffic:.2f} MB")
         else:
             self.traffic_label.config(text=f"流量统计: {kb_traffic:.2f} KB")
+        self.after(1000, self._tick_traffic)
+
+    def _stage_update(self, pair, text, color):
+        """暂存一条标签更新，按交易对合并，按update_freq的节奏批量刷新
+
+        高频行情下每个交易对始终只保留最新值，刷新间隔内的中间值被覆盖，
+        Tk重绘频率与消息速率解耦。
+        """
+        state = self._pending[pair]
+        state.text = text
+        state.color = color
+        state.dirty = True
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.after(self._flush_ms, self._flush_labels)
+
+    def _flush_labels(self):
+        """一次性应用所有有新值的标签更新"""
+        self._flush_scheduled = False
+        for pair, state in self._pending.items():
+            if state.dirty:
+                state.dirty = False
+                self.update_label_safe(pair, state.text, state.color)
 
     def update_label_safe(self, pair, text, color='black'):
-        """安全地更新标签文本"""
+        """更新标签文本；标签已销毁时将其从映射中移除"""
+        label = self.price_labels.get(pair)
+        if label is None:
+            return
         try:
-            if pair in self.price_labels and self.price_labels[pair].winfo_exists():
-                self.price_labels[pair].config(
-                    text=text,
-                    font=('Arial', 10, 'bold'),
-                    foreground=color
-                )
-        except Exception as e:
-            logging.error(f"更新标签出错: {e}")
+            label.config(text=text, foreground=color)
+        except tk.TclError:
+            # 标签已随窗口销毁：移除之后的更新只剩一次字典查找
+            self.price_labels.pop(pair, None)
 
 class CryptoDataViewer:
     def __init__(self, root):
@@ -418,7 +652,25 @@ class CryptoDataViewer:
         self.use_proxy = tk.BooleanVar(value=False)  # 默认不使用代理
         self.proxy_host = tk.StringVar(value="127.0.0.1")
         self.proxy_port = tk.StringVar(value="7897")
-        
+
+        # 行缓存：iid -> values元组，避免搜索/提交时逐行调用tree.item()做Tcl往返
+        self._rows = {}
+        # 搜索索引：基础货币(大写) -> 行iid列表，填表时一次建好
+        self._base_index = {}
+        # 勾选状态单独放在集合里，勾选列的'✓'只是显示
+        self._selected = set()
+
+        # 复用的HTTP会话：连接池保活，点击刷新时省去重复的TCP+TLS握手，
+        # 瞬时网络错误在适配器层重试，不再直接弹错误框
+        self.http = requests.Session()
+        self.http.mount('https://', HTTPAdapter(
+            pool_connections=4, pool_maxsize=8,
+            max_retries=Retry(total=3, backoff_factor=0.3)))
+        self.http.headers.update({'Accept-Encoding': 'gzip'})
+        # 关闭主窗口时一并释放连接池
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+
         # 创建UI组件
         self.create_top_frame()
         self.create_table()
@@ -515,89 +767,139 @@ class CryptoDataViewer:
         self.tree.bind('<Button-1>', self.toggle_selection)
 
     def refresh_data(self):
-        # 清空表格
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        # 重新加载数据
+        # 旧行在_populate_tree里统一清掉，这里直接重新加载
         self.load_data()
 
     def load_data(self):
-        """根据选择的交易所获取数据"""
-        if self.exchange.get() == "okx":
-            self.load_okx_data()
-        else:
-            self.load_binance_data()
+        """在后台线程抓取所选交易所的数据，避免HTTP请求卡住界面"""
+        exchange = self.exchange.get()
+        proxy = self.get_proxy_settings() if self.use_proxy.get() else None
+        threading.Thread(target=self._fetch_data,
+                         args=(exchange, proxy), daemon=True).start()
+
+    def _fetch_data(self, exchange, proxy):
+        """工作线程：抓取并解析数据，组装好行元组后交回主线程填表"""
+        try:
+            if exchange == "okx":
+                rows = self._fetch_okx_rows(proxy)
+            else:
+                rows = self._fetch_binance_rows(proxy)
+        except Exception as e:
+            self.root.after(0, messagebox.showerror, "错误",
+                            f"加载{exchange.upper()}数据时出错：{str(e)}\n请检查网络连接后重试")
+            return
+        if rows is None:
+            self.root.after(0, messagebox.showerror, "错误",
+                            f"获取{exchange.upper()}数据失败，请检查网络连接")
+            return
+        self.root.after(0, self._populate_tree, rows)
+
+    def _read_instruments_cache(self):
+        """本地缓存未过期则返回其中的合约数据，否则返回None"""
+        try:
+            if (os.path.exists(INSTRUMENTS_CACHE) and
+                    time.time() - os.path.getmtime(INSTRUMENTS_CACHE) < INSTRUMENTS_CACHE_TTL):
+                with open(INSTRUMENTS_CACHE, 'rb') as f:
+                    return _loads(f.read())
+        except Exception:
+            pass  # 缓存读不出来就当没有，走网络
+        return None
 
-    def load_okx_data(self):
-        """获取OKX永续合约数据"""
+    def _write_instruments_cache(self, content):
+        """把接口原始响应写入本地缓存，失败不影响主流程"""
         try:
+            with open(INSTRUMENTS_CACHE, 'wb') as f:
+                f.write(content)
+        except Exception:
+            pass
+
+    def _fetch_okx_rows(self, proxy):
+        """获取OKX永续合约数据（优先读本地缓存），返回表格行元组列表
+
+        在工作线程中执行，不碰任何Tk对象。
+        """
+        result = self._read_instruments_cache()
+        if result is None:
             url = urljoin(OKX_BASE_URL, "/api/v5/public/instruments")
             params = {
                 "instType": "SWAP"  # 获取永续合约
             }
-            
-            # 根据代理设置决定是否使用代理
-            proxy = self.get_proxy_settings() if self.use_proxy.get() else None
-            
-            response = requests.get(url, params=params, proxies=proxy)
+            response = self.http.get(url, params=params, proxies=proxy, timeout=10)
             result = response.json()
-            
-            if result and 'data' in result:
-                for item in result['data']:
-                    if item.get('settleCcy', '').upper() == 'USDT':  # 使用settleCcy替代quoteCcy
-                        values = ('',
-                                item.get('instId', ''),
-                                item.get('uly', '').split('-')[0],  # 从uly中提取基础货币
-                                item.get('settleCcy', ''),
-                                item.get('state', ''),
-                                item.get('ctVal', ''),
-                                item.get('lever', ''),
-                                item.get('ctValCcy', ''))
-                        self.tree.insert('', 'end', values=values)
-            else:
-                messagebox.showerror("错误", "获取OKX数据失败，请检查网络连接")
-        except Exception as e:
-            messagebox.showerror("错误", f"加载OKX数据时出错：{str(e)}\n请检查网络连接后重试")
+            # 只有确认是成功且非空的合约列表才落盘：
+            # OKX的错误应答也是合法JSON，缓存了它会把空表保鲜一小时
+            if (result and result.get('code') == '0' and result.get('data')):
+                self._write_instruments_cache(response.content)
 
-    def load_binance_data(self):
-        """获取Binance永续合约数据"""
+        if not result or 'data' not in result:
+            return None
+        rows = []
+        for item in result['data']:
+            if item.get('settleCcy', '').upper() == 'USDT':  # 使用settleCcy替代quoteCcy
+                rows.append(('',
+                             item.get('instId', ''),
+                             item.get('uly', '').split('-')[0],  # 从uly中提取基础货币
+                             item.get('settleCcy', ''),
+                             item.get('state', ''),
+                             item.get('ctVal', ''),
+                             item.get('lever', ''),
+                             item.get('ctValCcy', '')))
+        return rows
+
+    def _fetch_binance_rows(self, proxy):
+        """获取Binance永续合约数据，返回表格行元组列表
+
+        在工作线程中执行，不碰任何Tk对象。
+        """
+        url = urljoin(BINANCE_BASE_URL, "/fapi/v1/exchangeInfo")
+        response = self.http.get(url, proxies=proxy, timeout=10)
+        result = response.json()
+
+        if not result or 'symbols' not in result:
+            return None
+        rows = []
+        for item in result['symbols']:
+            if item.get('quoteAsset', '') == 'USDT' and item.get('status', '') == 'TRADING':
+                # 获取杠杆信息
+                lever_info = "N/A"
+                try:
+                    # 尝试获取杠杆信息
+                    for lev in item.get('leverageBracket', []):
+                        if 'bracket' in lev and lev['bracket'] == 0:
+                            lever_info = str(lev.get('initialLeverage', 'N/A'))
+                            break
+                except:
+                    pass
+
+                rows.append(('',
+                             item.get('symbol', ''),  # 合约名称
+                             item.get('baseAsset', ''),  # 基础货币
+                             item.get('quoteAsset', ''),  # 计价货币
+                             item.get('status', ''),  # 合约状态
+                             item.get('contractSize', 'N/A'),  # 面值
+                             lever_info,  # 最大杠杆
+                             item.get('quoteAsset', 'N/A')))  # 面值计价币种
+        return rows
+
+    def _populate_tree(self, rows):
+        """主线程：把工作线程组装好的行批量插入表格并重建行缓存"""
+        # 一次调用清空全部旧行，比逐行delete快得多
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self._rows.clear()
+        self._selected.clear()
+        self._base_index.clear()
+        # 批量插入期间先隐藏所有列，避免每插一行都触发一次布局重算
+        self.tree.configure(displaycolumns=())
         try:
-            # 获取Binance的合约信息
-            url = urljoin(BINANCE_BASE_URL, "/fapi/v1/exchangeInfo")
-            
-            # 根据代理设置决定是否使用代理
-            proxy = self.get_proxy_settings() if self.use_proxy.get() else None
-            
-            response = requests.get(url, proxies=proxy)
-            result = response.json()
-            
-            if result and 'symbols' in result:
-                for item in result['symbols']:
-                    if item.get('quoteAsset', '') == 'USDT' and item.get('status', '') == 'TRADING':
-                        # 获取杠杆信息
-                        lever_info = "N/A"
-                        try:
-                            # 尝试获取杠杆信息
-                            for lev in item.get('leverageBracket', []):
-                                if 'bracket' in lev and lev['bracket'] == 0:
-                                    lever_info = str(lev.get('initialLeverage', 'N/A'))
-                                    break
-                        except:
-                            pass
-                        
-                        values = ('',
-                                item.get('symbol', ''),  # 合约名称
-                                item.get('baseAsset', ''),  # 基础货币
-                                item.get('quoteAsset', ''),  # 计价货币
-                                item.get('status', ''),  # 合约状态
-                                item.get('contractSize', 'N/A'),  # 面值
-                                lever_info,  # 最大杠杆
-                                item.get('quoteAsset', 'N/A'))  # 面值计价币种
-                        self.tree.insert('', 'end', values=values)
-            else:
-                messagebox.showerror("错误", "获取Binance数据失败，请检查网络连接")
-        except Exception as e:
-            messagebox.showerror("错误", f"加载Binance数据时出错：{str(e)}\n请检查网络连接后重试")
+            for values in rows:
+                iid = self.tree.insert('', 'end', values=values)
+                self._rows[iid] = values
+                # baseCcy是第三列
+                self._base_index.setdefault(str(values[2]).upper(), []).append(iid)
+        finally:
+            self.tree.configure(displaycolumns='#all')
 
     def get_proxy_settings(self):
         """根据UI中的设置构建代理字典"""
@@ -611,23 +913,26 @@ class CryptoDataViewer:
             }
         return None
 
+    def on_close(self):
+        """关闭主窗口时释放HTTP连接池"""
+        self.http.close()
+        self.root.destroy()
+
     def search_currency(self):
         search_text = self.search_var.get().upper()
-        for item in self.tree.get_children():
-            values = self.tree.item(item)['values']
-            if search_text in str(values[2]).upper():  # baseCcy是第三列
-                self.tree.see(item)  # 滚动到匹配项
-                self.tree.selection_set(item)  # 选中匹配项
-            else:
-                self.tree.selection_remove(item)
+        # 在基础货币索引上匹配：键的数量远少于行数（一币多约时共享键）
+        matches = []
+        for base, iids in self._base_index.items():
+            if search_text in base:
+                matches.extend(iids)
+        self.tree.selection_set(matches)
+        if matches:
+            self.tree.see(matches[0])  # 滚动到第一个匹配项
 
     def start_monitoring(self):
-        # 获取选中的交易对
-        selected_pairs = []
-        for item in self.tree.get_children():
-            values = self.tree.item(item)['values']
-            if values[0] == '✓':  # 如果第一列有勾选标记
-                selected_pairs.append(values[1])  # 添加交易对ID
+        # 从勾选集合中获取选中的交易对（按表格行序）
+        selected_pairs = [values[1] for iid, values in self._rows.items()
+                          if iid in self._selected]
         
         if selected_pairs:
             # 获取代理设置
@@ -653,10 +958,13 @@ class CryptoDataViewer:
             column = self.tree.identify_column(event.x)
             if column == '#1':  # 第一列（选择列）
                 item = self.tree.identify_row(event.y)
-                current_value = self.tree.item(item)['values'][0]
-                new_values = list(self.tree.item(item)['values'])
-                new_values[0] = '✓' if current_value == '' else ''
-                self.tree.item(item, values=new_values)
+                # 勾选状态在集合里翻转，Tcl只写那一个单元格
+                if item in self._selected:
+                    self._selected.discard(item)
+                    self.tree.set(item, 'selected', '')
+                else:
+                    self._selected.add(item)
+                    self.tree.set(item, 'selected', '✓')
 
 def main():
     root = tk.Tk()